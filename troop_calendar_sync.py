@@ -2,7 +2,7 @@
 
 ##    .\.venv\Scripts\Activate.ps1
 
-##    pip install playwright beautifulsoup4 python-dateutil python-dotenv
+##    pip install playwright beautifulsoup4 lxml python-dotenv requests
 
 ##    python -m playwright install
 
@@ -12,16 +12,26 @@
 # =========================
 # IMPORTS
 # =========================
-import html
+import asyncio
+from html import unescape
 import os
 import re
 import hashlib
+import io
+import json
 from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
 
+import requests
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
-from dateutil import parser as dtparser
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+from bs4 import BeautifulSoup, FeatureNotFound
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # detail page text falls back to BeautifulSoup
+    etree = lxml_html = None
 
 
 # =========================
@@ -32,80 +42,368 @@ load_dotenv()
 BASE = os.getenv("TWH_BASE", "").rstrip("/")
 USERNAME = os.getenv("TWH_USERNAME")
 PASSWORD = os.getenv("TWH_PASSWORD")
+HEADLESS = os.getenv("TWH_HEADLESS", "1") != "0"  # TWH_HEADLESS=0 to watch the browser
+
+STATE_FILE = os.getenv("TWH_STATE_FILE", "twh_state.json")  # saved login session (cookies)
+CACHE_FILE = os.getenv("TWH_CACHE_FILE", "sync_cache.json")  # parsed events from the last run
+CACHE_VERSION = 1  # bump when parse_event_detail output changes
 
 OUTPUT_ICS = r"C:\Users\MatthewCollins\OneDrive\Scouts\Troop_1\CalendarSync\troop_calendar.ics"
 LOCAL_TZ = timezone(timedelta(hours=-5))
+DETAIL_CONCURRENCY = 8  # event detail pages fetched at once
+BLOCKED_RESOURCE_TYPES = {"image", "font", "stylesheet", "media"}  # not needed for scraping
+
+# Precompiled patterns (used in per-link / per-event loops)
+_RE_FORMDETAIL = re.compile(r"FormDetail\.aspx\?[^'\"()]+", re.I)
+_RE_FORMDETAIL_ID = re.compile(r"FormDetail\.aspx\?[^\"'<> ]*ID=\d+[^\"'<> ]*", re.I)
+# Start tag / any tag, allowing ">" inside quoted attribute values
+_RE_START_TAG = re.compile(r"<(?P<tag>[a-z][a-z0-9]*)\b(?P<attrs>(?:[^>\"']|\"[^\"]*\"|'[^']*')*)>", re.I)
+_RE_TAG = re.compile(r"<(?:[^>\"']|\"[^\"]*\"|'[^']*')*>")
+_RE_ID = re.compile(r"ID=(\d+)")
+_RE_TITLE_DATE = re.compile(r"\((\d{2})/(\d{2})/(\d{2,4})\)")
+_RE_LOC = re.compile(r"Location:\s*(.+?)(?:\s{2,}|$)", re.I)
+# Date, time and "Location:" label in a single scan of the detail text
+_RE_DETAIL_FIELDS = re.compile(
+    r"(?P<date>\d{1,2}/\d{1,2}/\d{2,4})"
+    r"|(?P<time>\d{1,2}:\d{2}\s*(?:AM|PM))"
+    r"|(?P<loc>Location:)",
+    re.I,
+)
+_DETAIL_SCAN_CHARS = 4000  # date/time/location sit near the top of a detail page
+
+# Visible page text straight from the lxml tree (no BeautifulSoup pass)
+if etree is not None:
+    _XP_PAGE_TEXT = etree.XPath("//text()[not(ancestor::script or ancestor::style)]")
+_RE_TRAIL_DATE = re.compile(r"\s*\(\d{1,2}/\d{1,2}/\d{2,4}\)\s*$")
+_RE_LOGON = re.compile(r"Log\s*On", re.I)
+
+# RFC 5545 TEXT escaping, applied in one pass with str.translate
+_ICS_ESCAPES = {"\\": "\\\\", ";": "\\;", ",": "\\,"}
+_ICS_SINGLE = str.maketrans({**_ICS_ESCAPES, "\n": " ", "\r": " "})  # single-line fields
+_ICS_DESC = str.maketrans({**_ICS_ESCAPES, "\n": "\\n", "\r": ""})
 
 # =========================
 # FUNCTIONS
 # =========================
 
+def is_page(url: str, page_name: str) -> bool:
+    """
+    True if url's path is page_name (e.g. "FormDetail.aspx"). Only the path counts:
+    login redirects carry the original page in ?ReturnUrl=.
+    """
+    return urlsplit(url).path.lower() == "/" + page_name.lower()
+
+
+def make_soup(markup: str | bytes) -> BeautifulSoup:
+    """
+    Parse HTML with the C-based lxml parser, falling back to html.parser
+    when lxml isn't installed.
+    """
+    try:
+        return BeautifulSoup(markup, "lxml")
+    except FeatureNotFound:
+        return BeautifulSoup(markup, "html.parser")
+
 
 def extract_event_links_from_form_list(html: str):
     """
-    Parse the FormList page and return a list of absolute URLs to FormDetail pages.
+    Scan the FormList page and return a list of absolute URLs to FormDetail pages.
 
     TroopWebHost often embeds links as:
       - <a href="FormDetail.aspx?...">
       - javascript:LinkTo('FormDetail.aspx?...','')
       - onclick="LinkTo('FormDetail.aspx?...','')"
-    """
-    soup = BeautifulSoup(html, "html.parser")
 
-    found = []
-
-    def add_href(href: str, text: str = ""):
-        if not href:
-            return
-        href = href.strip()
+    Only URLs are needed here, so the raw HTML is scanned with regexes
+    instead of being parsed into a tree.
+    """
+    def to_url(href: str):
+        # Attribute values are still HTML-escaped (&amp;, &#39;) in the raw page
+        href = unescape(href.strip())
 
         # Pull FormDetail URL out of javascript:LinkTo('...')
-        m = re.search(r"FormDetail\.aspx\?[^'\"()]+", href, re.I)
+        m = _RE_FORMDETAIL.search(href)
         if m:
             href = m.group(0)
 
         if "FormDetail.aspx" not in href or "ID=" not in href:
-            return
+            return None
 
         # Make absolute
         if href.startswith("http"):
-            url = href
-        else:
-            url = "https://www.troopwebhost.org/" + href.lstrip("/")
+            return href
+        return "https://www.troopwebhost.org/" + href.lstrip("/")
+
+    # 1) Titles: text of the element (<a>, or e.g. an onclick <tr>) whose
+    # href/onclick points at a FormDetail page. Anchor text wins over rows.
+    lower = html.lower()
+    anchor_titles = {}
+    other_titles = {}
+    for el in _RE_START_TAG.finditer(html):
+        attrs = el.group("attrs")
+        if "formdetail" not in attrs.lower():
+            continue
+
+        tag = el.group("tag").lower()
+        end = lower.find(f"</{tag}", el.end())
+        inner = html[el.end():end] if end >= 0 else ""
+        text = " ".join(unescape(_RE_TAG.sub(" ", inner)).split())
+
+        titles = anchor_titles if tag == "a" else other_titles
+        for m in _RE_FORMDETAIL_ID.finditer(attrs):
+            url = to_url(m.group(0))
+            if url and url not in titles:
+                titles[url] = text
+
+    # 2) URLs: every FormDetail.aspx?...ID=... in the page, wherever it's embedded
+    found = []
+    for m in _RE_FORMDETAIL_ID.finditer(html):
+        url = to_url(m.group(0))
+        if url:
+            title = anchor_titles.get(url, other_titles.get(url, ""))
+            found.append({"url": url, "title": title})
+
+    # Deduplicate, keeping first-seen order (repeats of a URL carry the same title)
+    return list({x["url"]: x for x in found}.values())
+
+
+def scan_detail_fields(text: str, pos: int = 0, endpos: int | None = None):
+    """
+    Find the first date, time and "Location:" value in text[pos:endpos] in one pass.
+    Returns (date, time, location); each is None when not found.
+    """
+    date = time = loc = None
+    if endpos is None:
+        endpos = len(text)
+    for m in _RE_DETAIL_FIELDS.finditer(text, pos, endpos):
+        kind = m.lastgroup
+        if kind == "date":
+            if date is None:
+                date = m.group("date")
+        elif kind == "time":
+            if time is None:
+                time = m.group("time")
+        elif loc is None:
+            # Only the label is matched here, so the scan can carry on past it
+            lm = _RE_LOC.match(text, m.start())
+            if lm:
+                loc = lm.group(1).strip()
+
+        if date is not None and time is not None and loc is not None:
+            break
+
+    return date, time, loc
+
+
+def local_date(mm: str, dd: str, yy: str) -> datetime:
+    """
+    Midnight LOCAL_TZ for month/day/year strings; 2-digit years are taken as 20YY.
+    """
+    year = int(yy)
+    if year < 100:
+        year += 2000
+    return datetime(year, int(mm), int(dd), 0, 0, tzinfo=LOCAL_TZ)
+
+
+def detail_page_text(detail_html: str | bytes) -> str:
+    """
+    Return the whitespace-normalized text of a FormDetail page, read with an lxml
+    XPath when lxml is available, otherwise with BeautifulSoup.
+    """
+    tree = None
+    if lxml_html is not None and detail_html.strip():
+        try:
+            tree = lxml_html.fromstring(detail_html)
+        except (ValueError, etree.ParserError):  # e.g. encoding declaration in a str, no elements
+            tree = None
+
+    if tree is None:
+        soup = make_soup(detail_html)
+        return " ".join(soup.get_text("\n", strip=True).split())
+
+    return " ".join(" ".join(_XP_PAGE_TEXT(tree)).split())
+
+
+def parse_event_detail(detail_html: str | bytes, url: str, title_guess: str):
+    """
+    Extract best-available date/time/location from a FormDetail page.
+    Returns an event dict for build_ics, or None if no date could be found.
+    """
+    full_text = detail_page_text(detail_html)
+    date_str = time_str = loc = None
+
+    # Try to find a date/time in the detail page text (best-effort)
+    # Common patterns: 01/17/26, 01/17/2026, 1/17/26, etc.
+    # Scan the top of the page first, cut on a word boundary so a date isn't split;
+    # only for fields still missing, carry on from there to the end (never rescanning)
+    cut = len(full_text)
+    if cut > _DETAIL_SCAN_CHARS:
+        space = full_text.rfind(" ", 0, _DETAIL_SCAN_CHARS)
+        if space > 0:
+            cut = space
+    for pos, endpos in ((0, cut), (cut, len(full_text))):
+        if pos >= endpos or (date_str is not None and time_str is not None and loc is not None):
+            break
+        found = scan_detail_fields(full_text, pos, endpos)
+        date_str = date_str or found[0]
+        time_str = time_str or found[1]
+        loc = loc or found[2]
+    dtstart = None
+
+    if date_str:
+        # If we find a date, parse it (M/D/YY or M/D/YYYY)
+        try:
+            dtstart = local_date(*date_str.split("/"))
+        except:
+            dtstart = None
+
+    # Fallback: use date in title if present
+    if not dtstart:
+        m2 = _RE_TITLE_DATE.search(title_guess)
+        if m2:
+            dtstart = local_date(m2.group(1), m2.group(2), m2.group(3))
+
+    if not dtstart:
+        # Can't place it on a calendar without a date
+        return None
+
+    # Assume all-day unless we can find a time
+    all_day = True
+    dtend = dtstart + timedelta(days=1)
+
+    # Try to find time like "7:00 PM" or "19:00"
+    if time_str:
+        try:
+            # "7:00 PM" / "7:00pm" -> "7:00PM" for strptime, then merge onto the date
+            tm = datetime.strptime("".join(time_str.split()).upper(), "%I:%M%p")
+            dtstart = dtstart.replace(hour=tm.hour, minute=tm.minute)
+            dtend = dtstart + timedelta(hours=2)  # default duration
+            all_day = False
+        except:
+            pass
+
+    summary = _RE_TRAIL_DATE.sub("", title_guess).strip()
 
-        title = " ".join((text or "").split())
-        found.append({"url": url, "title": title})
+    return {
+        "summary": summary,
+        "dtstart": dtstart,
+        "dtend": dtend,
+        "description": full_text[:2000],  # cap so ICS doesn't get huge
+        "location": loc or "",
+        "url": url,
+        "all_day": all_day,
+    }
 
-    # 1) Normal anchors
-    for a in soup.select("a"):
-        href = a.get("href", "") or ""
-        txt = a.get_text(" ", strip=True)
-        add_href(href, txt)
 
-        # Some pages use onclick with LinkTo(...)
-        onclick = a.get("onclick", "") or ""
-        add_href(onclick, txt)
+async def skip_assets(route):
+    """
+    Route handler: abort asset loads by resource type, so versioned URLs
+    (site.css?v=3, WebResource.axd?...) are caught too.
+    """
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
 
-    # 2) Any element with onclick LinkTo(...)
-    for el in soup.select("[onclick]"):
-        onclick = el.get("onclick", "") or ""
-        txt = el.get_text(" ", strip=True)
-        add_href(onclick, txt)
 
-    # 3) As a last resort: regex scan entire HTML for FormDetail.aspx?...ID=...
-    for m in re.finditer(r"FormDetail\.aspx\?[^\"'<> ]*ID=\d+[^\"'<> ]*", html, re.I):
-        add_href(m.group(0), "")
+async def wait_until_settled(page, timeout: int = 10000):
+    """
+    Best-effort wait for the page and its frames to stop loading.
+    Returns quietly on timeout (some pages keep polling the server).
+    """
+    try:
+        await page.wait_for_load_state("networkidle", timeout=timeout)
+    except PlaywrightTimeoutError:
+        pass
 
-    # Deduplicate
-    seen = set()
-    out = []
-    for x in found:
-        if x["url"] not in seen:
-            seen.add(x["url"])
-            out.append(x)
 
-    return out
+async def get_content_frame(page, expected_url_substring: str | None = None, timeout: int = 30000):
+    """
+    Return the best candidate content frame.
+    If expected_url_substring is provided, prefer a frame whose URL contains it;
+    otherwise (or if none matches) take the first non-main frame.
+    Only waits, on framenavigated rather than polling, when there's no candidate yet.
+    """
+    needle = (expected_url_substring or "").lower()
+
+    def preferred(fr) -> bool:
+        return bool(needle) and needle in (fr.url or "").lower()
 
+    def usable(fr) -> bool:
+        return preferred(fr) or fr.parent_frame is not None
+
+    frames = page.frames
+    fr = next((fr for fr in frames if preferred(fr)), None)
+    if fr is None and len(frames) > 1:
+        fr = frames[1]
+    if fr is None:
+        try:
+            fr = await page.wait_for_event("framenavigated", predicate=usable, timeout=timeout)
+        except PlaywrightTimeoutError:
+            urls = [f.url for f in page.frames]
+            raise RuntimeError(f"Content frame never became available. Frames seen: {urls}")
+
+    await fr.wait_for_load_state("domcontentloaded")
+    return fr
+
+
+def load_cache(path: str) -> dict:
+    """
+    Load the per-URL detail cache written by save_cache; empty if missing or stale.
+    Entries look like {"etag", "sha1", "title", "event"} with event datetimes as ISO strings.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != CACHE_VERSION:
+        return {}
+    return data.get("entries", {})
+
+
+def save_cache(path: str, entries: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "entries": entries}, f)
+
+
+def event_to_json(ev):
+    if ev is None:
+        return None
+    return {**ev, "dtstart": ev["dtstart"].isoformat(), "dtend": ev["dtend"].isoformat()}
+
+
+def event_from_json(data):
+    if data is None:
+        return None
+    return {
+        **data,
+        "dtstart": datetime.fromisoformat(data["dtstart"]),
+        "dtend": datetime.fromisoformat(data["dtend"]),
+    }
+
+
+def fold_ics_line(line: str) -> bytes:
+    """
+    Encode a content line as UTF-8 and fold it to 75 octets (RFC 5545 3.1)
+    without splitting a character. Continuation lines start with a space,
+    so they carry 74 octets.
+    """
+    b = line.encode("utf-8")
+    if len(b) <= 75:
+        return b
+
+    chunks = []
+    start, limit = 0, 75
+    while len(b) - start > limit:
+        end = start + limit
+        # Don't cut inside a multi-byte character (continuation bytes are 10xxxxxx)
+        while b[end] & 0xC0 == 0x80:
+            end -= 1
+        chunks.append(b[start:end])
+        start, limit = end, 74
+    chunks.append(b[start:])
+    return b"\r\n ".join(chunks)
 
 
 def build_ics(events):
@@ -118,59 +416,63 @@ def build_ics(events):
       - location (str)
       - url (str)
       - all_day (bool)
+
+    Returns the calendar as UTF-8 encoded bytes.
     """
-    def fmt_dt(dt: datetime) -> str:
-        # Use UTC for ICS timestamps unless all-day
-        return dt.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    buf = io.BytesIO()
+    w = buf.write
 
-    lines = [
-        "BEGIN:VCALENDAR",
-        "VERSION:2.0",
-        "PRODID:-//TroopCalendarSync//EN",
-        "CALSCALE:GREGORIAN",
-        "METHOD:PUBLISH",
-    ]
+    w(
+        b"BEGIN:VCALENDAR\r\n"
+        b"VERSION:2.0\r\n"
+        b"PRODID:-//TroopCalendarSync//EN\r\n"
+        b"CALSCALE:GREGORIAN\r\n"
+        b"METHOD:PUBLISH\r\n"
+    )
 
-    now_utc = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    now_utc = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}"
 
     for ev in events:
-        uid_src = (ev.get("url","") + "|" + ev.get("summary","")).encode("utf-8", errors="ignore")
-        uid = hashlib.sha1(uid_src).hexdigest() + "@troopwebhost"
-
-        lines.append("BEGIN:VEVENT")
-        lines.append(f"UID:{uid}")
-        lines.append(f"DTSTAMP:{now_utc}")
+        # Stable UID from url|summary, hashed piecewise (no concatenated copy).
+        # Not a security use, so skip the FIPS check.
+        h = hashlib.sha1(usedforsecurity=False)
+        h.update(ev.get("url", "").encode("utf-8", errors="ignore"))
+        h.update(b"|")
+        h.update(ev.get("summary", "").encode("utf-8", errors="ignore"))
+        uid = h.hexdigest() + "@troopwebhost"
 
         if ev.get("all_day"):
             # All-day uses DATE (no time)
             ds = ev["dtstart"].date().strftime("%Y%m%d")
             de = ev["dtend"].date().strftime("%Y%m%d")
-            lines.append(f"DTSTART;VALUE=DATE:{ds}")
-            lines.append(f"DTEND;VALUE=DATE:{de}")
+            dates = f"DTSTART;VALUE=DATE:{ds}\r\nDTEND;VALUE=DATE:{de}\r\n"
         else:
-            lines.append(f"DTSTART:{fmt_dt(ev['dtstart'])}")
-            lines.append(f"DTEND:{fmt_dt(ev['dtend'])}")
+            # Use UTC for ICS timestamps unless all-day
+            ds_utc = ev["dtstart"].astimezone(timezone.utc)
+            de_utc = ev["dtend"].astimezone(timezone.utc)
+            dates = f"DTSTART:{ds_utc:%Y%m%dT%H%M%SZ}\r\nDTEND:{de_utc:%Y%m%dT%H%M%SZ}\r\n"
 
-        summary = ev.get("summary", "").replace("\n", " ").strip()
-        lines.append(f"SUMMARY:{summary}")
+        summary = ev.get("summary", "").translate(_ICS_SINGLE).strip()
+        w(f"BEGIN:VEVENT\r\nUID:{uid}\r\nDTSTAMP:{now_utc}\r\n{dates}".encode("utf-8"))
+        w(fold_ics_line(f"SUMMARY:{summary}") + b"\r\n")
 
-        loc = (ev.get("location") or "").replace("\n", " ").strip()
+        loc = (ev.get("location") or "").translate(_ICS_SINGLE).strip()
         if loc:
-            lines.append(f"LOCATION:{loc}")
+            w(fold_ics_line(f"LOCATION:{loc}") + b"\r\n")
 
         desc_parts = []
         if ev.get("description"):
-            desc_parts.append(ev["description"].strip())
+            desc_parts.append(ev["description"].strip().translate(_ICS_DESC))
         if ev.get("url"):
-            desc_parts.append(ev["url"].strip())
-        desc = "\\n\\n".join(desc_parts).replace("\n", "\\n")
+            desc_parts.append(ev["url"].strip().translate(_ICS_DESC))
+        desc = "\\n\\n".join(desc_parts)
         if desc:
-            lines.append(f"DESCRIPTION:{desc}")
+            w(fold_ics_line(f"DESCRIPTION:{desc}") + b"\r\n")
 
-        lines.append("END:VEVENT")
+        w(b"END:VEVENT\r\n")
 
-    lines.append("END:VCALENDAR")
-    return "\r\n".join(lines) + "\r\n"
+    w(b"END:VCALENDAR\r\n")
+    return buf.getvalue()
 
 
 
@@ -178,185 +480,189 @@ def build_ics(events):
 # MAIN
 # =========================
 
-def main():
-    if not (BASE and USERNAME and PASSWORD):
-        raise RuntimeError("Missing BASE/USERNAME/PASSWORD. Check your .env file.")
-
+async def sync_calendar():
     def dump_frames(page, label):
         print(label)
         for fr in page.frames:
             print(" -", fr.url)
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)  # set True after it works
-        context = browser.new_context()
-        page = context.new_page()
-
-        # 1) Load the troop site (frameset)
-        page.goto(f"{BASE}/Index.htm", wait_until="domcontentloaded")
-        dump_frames(page, "FRAME URLS (initial):")
-
-        # 2) Get content frame helper
-        def get_content_frame(expected_url_substring: str | None = None):
-            """
-            Return the best candidate content frame.
-            If expected_url_substring is provided, prefer a frame whose URL contains it.
-            """
-            last_urls = None
-            for _ in range(60):  # up to ~30 seconds
-                frames = page.frames
-                urls = [fr.url for fr in frames]
-                last_urls = urls
-
-                # Prefer a frame matching expected URL substring
-                if expected_url_substring:
-                    for fr in frames:
-                        if expected_url_substring.lower() in (fr.url or "").lower():
-                            try:
-                                fr.locator("body").count()
-                                return fr
-                            except:
-                                pass
-
-                # Otherwise: choose first non-main frame that has a body
-                for fr in frames[1:]:
-                    try:
-                        fr.locator("body").count()
-                        return fr
-                    except:
-                        pass
-
-                page.wait_for_timeout(500)
-
-            raise RuntimeError(f"Content frame never became available. Frames seen: {last_urls}")
-
-        # ✅ 3) Acquire the content frame BEFORE using it
-        content = get_content_frame("Redirect.htm")
-        print("Using content frame URL:", content.url)
-
-        # ✅ 4) Click Log On
-        try:
-            content.get_by_role("link", name=re.compile(r"Log\s*On", re.I)).click(timeout=8000)
-        except:
-            content.locator("a", has_text=re.compile(r"Log\s*On", re.I)).first.click(timeout=8000)
-
-        page.wait_for_timeout(500)
-        dump_frames(page, "FRAME URLS (after clicking Log On):")
-
-
-        # 5) Force open menu and go to events list page
-        content = get_content_frame()
-        try:
-            content.evaluate("togglemenu();")
-        except:
-            pass
-
-        events_list_url = "https://www.troopwebhost.org/FormList.aspx?Menu_Item_ID=45936&Stack=1"
-        print("Navigating to events list:", events_list_url)
-        page.goto(events_list_url, wait_until="domcontentloaded", timeout=20000)
-        page.wait_for_timeout(800)
-
-        content = get_content_frame("FormList.aspx")
-        html = content.content()
-        with open("events_list.html", "w", encoding="utf-8") as f:
-            f.write(html)
-
-        links = [x for x in extract_event_links_from_form_list(html)
-                 if "Form_ID=182" in x["url"] and "ID=" in x["url"]]
-        print(f"Found {len(links)} event detail links")
-
-        # 6) Visit each detail page and extract best-available date/time/location
-        events = []
-        for i, x in enumerate(links, start=1):
-            url = x["url"]
-            m_id = re.search(r"ID=(\d+)", url)
-            event_id = m_id.group(1) if m_id else "unknown"
-            title_guess = x["title"] or f"(untitled) ID={event_id}"
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(
+            headless=HEADLESS,
+            args=["--disable-blink-features=AutomationControlled"],
+        )
+        have_state = os.path.exists(STATE_FILE)
+        context = None
+        if have_state:
+            try:
+                context = await browser.new_context(storage_state=STATE_FILE)
+            except (OSError, ValueError, PlaywrightError) as e:
+                print(f"Ignoring unreadable {STATE_FILE}; logging in fresh ({e})")
+                have_state = False
+        if context is None:
+            context = await browser.new_context()
+        await context.route("**/*", skip_assets)
+        page = await context.new_page()
+
+        async def log_in():
+            # 1) Load the troop site (frameset)
+            await page.goto(f"{BASE}/Index.htm", wait_until="domcontentloaded")
+            dump_frames(page, "FRAME URLS (initial):")
+
+            # ✅ 2) Acquire the content frame BEFORE using it
+            content = await get_content_frame(page, "Redirect.htm")
+            print("Using content frame URL:", content.url)
+
+            # ✅ 3) Click Log On
+            try:
+                await content.get_by_role("link", name=_RE_LOGON).click(timeout=8000)
+            except:
+                await content.locator("a", has_text=_RE_LOGON).first.click(timeout=8000)
+
+            await wait_until_settled(page)
+            dump_frames(page, "FRAME URLS (after clicking Log On):")
+
+            # Force open menu
+            content = await get_content_frame(page)
+            try:
+                await content.evaluate("togglemenu();")
+            except:
+                pass
+
+        async def open_events_list():
+            # 4) Go to events list page and collect the event links.
+            # None means we were bounced to a login page or the list came back empty.
+            events_list_url = "https://www.troopwebhost.org/FormList.aspx?Menu_Item_ID=45936&Stack=1"
+            print("Navigating to events list:", events_list_url)
+            await page.goto(events_list_url, wait_until="domcontentloaded", timeout=20000)
+            await wait_until_settled(page)
+            if not is_page(page.url, "FormList.aspx"):
+                return None
+
+            content = await get_content_frame(page, "FormList.aspx")
+            html = await content.content()
+            with open("events_list.html", "w", encoding="utf-8") as f:
+                f.write(html)
+
+            links = [x for x in extract_event_links_from_form_list(html)
+                     if "Form_ID=182" in x["url"] and "ID=" in x["url"]]
+            print(f"Found {len(links)} event detail links")
+            return links or None
+
+        # Reuse the saved session if there is one; only log in when it has expired
+        links = await open_events_list() if have_state else None
+        if links is None:
+            if have_state:
+                print("Saved session expired; logging in again")
+            await log_in()
+            links = await open_events_list()
+            if links is None:
+                # Never overwrite the published calendar with an empty one
+                raise RuntimeError(f"No event links on the events list after logging in: {page.url}")
+
+        # Save after every successful load so a refreshed (sliding) session cookie is kept
+        await context.storage_state(path=STATE_FILE)
+
+        # Detail pages are static HTML once logged in, so the browser is only
+        # needed for the JS-driven login; hand its cookies to a plain HTTP session.
+        session = requests.Session()
+        for c in await context.cookies():
+            session.cookies.set(c["name"], c["value"], domain=c["domain"], path=c["path"])
+
+        await context.close()
+        await browser.close()
+
+    # 5) Fetch detail pages concurrently (bounded so we don't hammer the site).
+    # Pages we've seen before are requested conditionally so unchanged ones can 304.
+    cache = load_cache(CACHE_FILE)
+    sem = asyncio.Semaphore(DETAIL_CONCURRENCY)
+
+    async def fetch_detail(i: int, url: str, title_guess: str) -> requests.Response | None:
+        async with sem:
             print(f"[{i}/{len(links)}] Fetching: {title_guess}")
+            headers = {}
+            cached = cache.get(url)
+            if cached and cached.get("etag") and cached.get("title") == title_guess:
+                headers["If-None-Match"] = cached["etag"]
+            try:
+                resp = await asyncio.to_thread(session.get, url, headers=headers, timeout=20)
+                if resp.status_code != 304:
+                    resp.raise_for_status()
+            except requests.RequestException as e:
+                # One missing/forbidden event shouldn't sink the whole sync
+                print(f"[{i}/{len(links)}] Skipping {url}: {e}")
+                return None
+
+        # A session the site doesn't accept gets redirected to a login page with a 200
+        if not is_page(resp.url, "FormDetail.aspx"):
+            raise RuntimeError(f"Detail page redirected to {resp.url}; browser cookies weren't accepted")
+        return resp
+
+    jobs = []
+    for x in links:
+        m_id = _RE_ID.search(x["url"])
+        event_id = m_id.group(1) if m_id else "unknown"
+        jobs.append((x["url"], x["title"] or f"(untitled) ID={event_id}"))
+
+    responses = await asyncio.gather(*(
+        fetch_detail(i, url, title_guess)
+        for i, (url, title_guess) in enumerate(jobs, start=1)
+    ))
+
+    # 6) Extract best-available date/time/location from each page,
+    # reusing last run's result when the page (and its list title) is unchanged
+    events = []
+    new_cache = {}
+    reused = 0
+    for (url, title_guess), resp in zip(jobs, responses):
+        cached = cache.get(url)
+        if resp is None:
+            # Fetch failed; keep last run's event (and cache entry) rather than
+            # dropping it from the calendar over a transient error
+            if cached:
+                new_cache[url] = cached
+                ev = event_from_json(cached["event"])
+                if ev:
+                    events.append(ev)
+            continue
+
+        if resp.status_code == 304:
+            digest = cached["sha1"]
+        else:
+            digest = hashlib.sha1(resp.content, usedforsecurity=False).hexdigest()
 
-            # Navigate to the detail URL.
-            # (Do it on the page, not the old frame handle; frames can detach.)
-            page.goto(url, wait_until="domcontentloaded", timeout=20000)
-            page.wait_for_timeout(600)
-
-            # Find the frame that actually contains the FormDetail content
-            content = get_content_frame("FormDetail.aspx")
-            content.locator("body").wait_for(timeout=15000)
-
-            detail_html = content.content()
-            soup = BeautifulSoup(detail_html, "html.parser")
-
-            text = " ".join(soup.get_text("\n", strip=True).split())
+        if cached and cached["sha1"] == digest and cached["title"] == title_guess:
+            ev = event_from_json(cached["event"])
+            reused += 1
+        else:
+            # Raw bytes: requests assumes ISO-8859-1 for text/html without a charset,
+            # the parsers read the page's own meta charset instead
+            ev = parse_event_detail(resp.content, url, title_guess)
 
-            # Try to find a date/time in the detail page text (best-effort)
-            # Common patterns: 01/17/26, 01/17/2026, 1/17/26, etc.
-            m = re.search(r"(\d{1,2}/\d{1,2}/\d{2,4})", text)
-            dtstart = None
+        new_cache[url] = {
+            "etag": resp.headers.get("ETag") or (cached or {}).get("etag"),
+            "sha1": digest,
+            "title": title_guess,
+            "event": event_to_json(ev),
+        }
+        if ev:
+            events.append(ev)
 
-            if m:
-                # If we find a date, parse it
-                try:
-                    dtstart = dtparser.parse(m.group(1), dayfirst=False, yearfirst=False)
-                    dtstart = dtstart.replace(tzinfo=LOCAL_TZ)
-                except:
-                    dtstart = None
-
-            # Fallback: use date in title if present
-            if not dtstart:
-                m2 = re.search(r"\((\d{2})/(\d{2})/(\d{2,4})\)", title_guess)
-                if m2:
-                    mm, dd, yy = m2.group(1), m2.group(2), m2.group(3)
-                    year = int(yy)
-                    if year < 100:
-                        year += 2000
-                    dtstart = datetime(year, int(mm), int(dd), 0, 0, tzinfo=LOCAL_TZ)
-
-            if not dtstart:
-                # Can't place it on a calendar without a date
-                continue
-
-            # Assume all-day unless we can find a time
-            all_day = True
-            dtend = dtstart + timedelta(days=1)
-
-            # Try to find time like "7:00 PM" or "19:00"
-            tm = re.search(r"(\d{1,2}:\d{2}\s*(AM|PM))", text, re.I)
-            if tm:
-                try:
-                    # Parse date + time together
-                    dtstart2 = dtparser.parse(dtstart.strftime("%m/%d/%Y") + " " + tm.group(1))
-                    dtstart = dtstart2.replace(tzinfo=LOCAL_TZ)
-                    dtend = dtstart + timedelta(hours=2)  # default duration
-                    all_day = False
-                except:
-                    pass
-
-            # Best-effort location: look for a "Location:" label
-            loc = ""
-            lm = re.search(r"Location:\s*(.+?)(?:\s{2,}|$)", text, re.I)
-            if lm:
-                loc = lm.group(1).strip()
+    save_cache(CACHE_FILE, new_cache)
+    print(f"Reused {reused}/{len(jobs)} unchanged event pages")
 
-            summary = re.sub(r"\s*\(\d{1,2}/\d{1,2}/\d{2,4}\)\s*$", "", title_guess).strip()
+    ics = build_ics(events)
+    with open(OUTPUT_ICS, "wb") as f:
+        f.write(ics)
 
-            events.append({
-                "summary": summary,
-                "dtstart": dtstart,
-                "dtend": dtend,
-                "description": text[:2000],  # cap so ICS doesn't get huge
-                "location": loc,
-                "url": url,
-                "all_day": all_day,
-            })
+    print(f"Wrote {OUTPUT_ICS} with {len(events)} events")
 
-        ics = build_ics(events)
-        with open(OUTPUT_ICS, "w", encoding="utf-8") as f:
-            f.write(ics)
 
-        print(f"Wrote {OUTPUT_ICS} with {len(events)} events")
+def main():
+    if not (BASE and USERNAME and PASSWORD):
+        raise RuntimeError("Missing BASE/USERNAME/PASSWORD. Check your .env file.")
 
-        context.close()
-        browser.close()
+    asyncio.run(sync_calendar())
 
 
 if __name__ == "__main__":